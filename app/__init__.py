@@ -1,40 +1,142 @@
-from flask import Flask
+from flask import Flask, g
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
 from flask_login import LoginManager
+from flask_caching import Cache
+from cachetools import TTLCache
 import os
+import pathlib
+import threading
+
+# Resolved once at import; create_app only references these, so repeated
+# factory calls (tests, workers) skip the abspath/stat dance.
+_BASE_DIR = pathlib.Path(__file__).resolve().parent.parent
+_INSTANCE_DIR = _BASE_DIR / 'instance'
+_UPLOAD_DIR = _BASE_DIR / 'uploads'
+_INSTANCE_DIR.mkdir(exist_ok=True)
+_UPLOAD_DIR.mkdir(exist_ok=True)
 
 db = SQLAlchemy()
+cache = Cache()
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 login_manager.login_message_category = 'info'
 
+# Process-local cache for the user loader so repeated authenticated requests
+# within the TTL skip the per-request User SELECT entirely.
+_user_cache = TTLCache(maxsize=1024, ttl=30)
+_user_cache_lock = threading.Lock()
 
-def create_app():
-    app = Flask(__name__)
 
-    base_dir = os.path.abspath(os.path.dirname(os.path.dirname(__file__)))
-    instance_dir = os.path.join(base_dir, 'instance')
-    upload_dir = os.path.join(base_dir, 'uploads')
+def invalidate_cached_user(user_id):
+    """Drop a user from the loader cache (call on login/logout/user changes)."""
+    with _user_cache_lock:
+        _user_cache.pop(int(user_id), None)
 
-    # Auto-create required directories if they don't exist
-    os.makedirs(instance_dir, exist_ok=True)
-    os.makedirs(upload_dir, exist_ok=True)
+
+def create_app(config_overrides=None):
+    app = Flask(__name__)
 
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(instance_dir, 'stock.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + str(_INSTANCE_DIR / 'stock.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['UPLOAD_FOLDER'] = upload_dir
+    # Keep connections (and their PRAGMA state / page cache) alive across
+    # requests instead of reopening the database file per request.
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'poolclass': QueuePool,
+        'pool_size': 20,
+        'max_overflow': 10,
+        'pool_pre_ping': True,
+        'pool_recycle': 1800,
+        'connect_args': {'check_same_thread': False, 'timeout': 30},
+        # Page size for batched multi-VALUES INSERTs (bulk upload paths);
+        # keeps each statement's parameter list bounded.
+        'insertmanyvalues_page_size': 5000,
+    }
+    app.config['UPLOAD_FOLDER'] = str(_UPLOAD_DIR)
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB max upload
+    # Cap what the multipart parser keeps in RAM for non-file fields;
+    # anything larger spools to disk instead of ballooning the worker.
+    app.config['MAX_FORM_MEMORY_SIZE'] = 1 * 1024 * 1024
+    if config_overrides:
+        app.config.update(config_overrides)
+
+    # Server-side sessions: with REDIS_URL set, the cookie carries only a
+    # session id instead of the whole signed payload being re-parsed per
+    # request. Without it we fall back to Flask's default cookie sessions.
+    redis_url = os.environ.get('REDIS_URL')
+    if redis_url:
+        import redis
+        from flask_session import Session
+        app.config['SESSION_TYPE'] = 'redis'
+        app.config['SESSION_REDIS'] = redis.Redis.from_url(redis_url)
+        app.config['SESSION_USE_SIGNER'] = True
+        Session(app)
 
     db.init_app(app)
+    # Response/aggregate cache for read-heavy endpoints (charts). Shares
+    # the Redis instance with sessions when one is configured; otherwise
+    # an in-process SimpleCache is plenty for a single worker.
+    if redis_url:
+        app.config.setdefault('CACHE_TYPE', 'RedisCache')
+        app.config.setdefault('CACHE_REDIS_URL', redis_url)
+    else:
+        app.config.setdefault('CACHE_TYPE', 'SimpleCache')
+    app.config.setdefault('CACHE_DEFAULT_TIMEOUT', 120)
+    cache.init_app(app)
     login_manager.init_app(app)
 
     from app.models import User
 
     @login_manager.user_loader
     def load_user(user_id):
-        return db.session.get(User, int(user_id))
+        # Request-local memo: multiple current_user accesses resolve once.
+        cached = getattr(g, '_cached_user', None)
+        if cached is not None and cached.id == int(user_id):
+            return cached
+
+        uid = int(user_id)
+        with _user_cache_lock:
+            user = _user_cache.get(uid)
+        if user is None:
+            user = db.session.get(User, uid)
+            if user is not None:
+                # Detach before caching: a commit later in this request
+                # would otherwise expire the instance, and every cache hit
+                # for the next TTL window would blow up with
+                # DetachedInstanceError. Routes only read plain columns
+                # off current_user, which a detached instance serves fine.
+                db.session.expunge(user)
+                with _user_cache_lock:
+                    _user_cache[uid] = user
+        g._cached_user = user
+        return user
+
+    _register_blueprints(app)
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create database tables and seed the default admin user."""
+        _upgrade_legacy_schema()
+        db.create_all()
+        _seed_default_admin(app)
+
+    with app.app_context():
+        event.listens_for(db.engine, 'connect')(_set_sqlite_pragmas)
+        # Schema auto-creation keeps `python run.py` working out of the box;
+        # tests pass AUTO_SEED=False and run `flask init-db` once instead.
+        if app.config.get('AUTO_SEED', True):
+            _upgrade_legacy_schema()
+            db.create_all()
+            _seed_default_admin(app)
+
+    return app
+
 
+def _register_blueprints(app):
+    """Import and register blueprints (deferred to keep import costs off
+    code paths that never dispatch a request)."""
     from app.routes.auth import auth_bp
     from app.routes.stock import stock_bp
     from app.routes.excel import excel_bp
@@ -43,18 +145,74 @@ def create_app():
     app.register_blueprint(stock_bp)
     app.register_blueprint(excel_bp)
 
-    with app.app_context():
-        db.create_all()
-        _seed_default_admin(app)
 
-    return app
+def _set_sqlite_pragmas(dbapi_conn, connection_record):
+    """Tune SQLite on every new connection: WAL lets readers run during
+    writes, and the remaining PRAGMAs serve hot pages from mmap/cache."""
+    cursor = dbapi_conn.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA mmap_size=268435456')
+    cursor.execute('PRAGMA cache_size=-64000')
+    cursor.close()
+
+
+def _upgrade_legacy_schema():
+    """Rebuild the stocks table for databases created before total_value
+    became a SQL-generated column.
+
+    db.create_all() never alters existing tables, so an in-place upgrade
+    would otherwise keep the old plain column -- which nothing writes
+    anymore -- and every aggregate would read frozen values forever.
+    SQLite cannot ALTER a plain column into a STORED generated one, so:
+    move the old table aside, let create_all build the current schema,
+    copy the rows across (total_value recomputes itself) and drop the
+    old table.
+    """
+    from app.models import Stock
+
+    ddl = db.session.execute(db.text(
+        "SELECT sql FROM sqlite_master WHERE type='table' AND name='stocks'"
+    )).scalar()
+    if not ddl or 'GENERATED ALWAYS' in ddl:
+        return
+
+    # legacy_alter_table keeps RENAME from rewriting the FK clauses of
+    # referencing tables (stock_transfers) to point at the doomed copy.
+    db.session.execute(db.text('PRAGMA legacy_alter_table=ON'))
+    db.session.execute(db.text('ALTER TABLE stocks RENAME TO stocks_legacy'))
+    db.session.execute(db.text('PRAGMA legacy_alter_table=OFF'))
+    # Named indexes follow the rename and would collide with the ones
+    # create_all is about to make; auto-indexes (sql IS NULL) cannot and
+    # need not be dropped.
+    index_names = db.session.execute(db.text(
+        "SELECT name FROM sqlite_master WHERE type='index' "
+        "AND tbl_name='stocks_legacy' AND sql IS NOT NULL")).scalars().all()
+    for index_name in index_names:
+        db.session.execute(db.text(f'DROP INDEX "{index_name}"'))
+    db.session.commit()
+    db.create_all()
+    cols = ', '.join(
+        c.name for c in Stock.__table__.columns if c.computed is None)
+    db.session.execute(db.text(
+        f'INSERT INTO stocks ({cols}) SELECT {cols} FROM stocks_legacy'))
+    db.session.execute(db.text('DROP TABLE stocks_legacy'))
+    db.session.commit()
 
 
 def _seed_default_admin(app):
     """Create a default admin user if no users exist."""
-    from app.models import User
-    if User.query.count() == 0:
-        admin = User(username='admin', role='admin')
-        admin.set_password('admin123')
-        db.session.add(admin)
-        db.session.commit()
+    from sqlalchemy import insert, select
+    from app.models import User, _password_hasher
+
+    # SELECT 1 LIMIT 1 instead of a full COUNT; the common already-seeded
+    # boot path stops here without hashing or an ORM flush.
+    if db.session.scalar(select(User.id).limit(1)) is not None:
+        return
+    db.session.execute(insert(User).values(
+        username='admin',
+        role='admin',
+        password_hash=_password_hasher.hash('admin123'),
+    ))
+    db.session.commit()
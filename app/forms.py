@@ -6,93 +6,98 @@ from wtforms import (
 )
 from wtforms.validators import DataRequired, Length, EqualTo, Optional, NumberRange
 
+# Validators and select choices are stateless, so share singletons instead of
+# re-allocating them per field definition.
+_REQUIRED = DataRequired()
+_OPTIONAL = Optional()
+_NON_NEGATIVE = NumberRange(min=0)
+
+_CATEGORY_CHOICES = (
+    ('', '-- Select Category --'),
+    ('Laptop', 'Laptop'), ('Desktop', 'Desktop'), ('Monitor', 'Monitor'),
+    ('Printer', 'Printer'), ('Scanner', 'Scanner'), ('Phone', 'Phone'),
+    ('Tablet', 'Tablet'), ('Server', 'Server'), ('Networking', 'Networking'),
+    ('Keyboard', 'Keyboard'), ('Mouse', 'Mouse'), ('Headset', 'Headset'),
+    ('Webcam', 'Webcam'), ('Projector', 'Projector'), ('UPS', 'UPS'),
+    ('Software License', 'Software License'), ('Furniture', 'Furniture'),
+    ('Other', 'Other'),
+)
+_CONDITION_CHOICES = (
+    ('Good', 'Good'), ('Damaged', 'Damaged'), ('Needs Repair', 'Needs Repair'),
+)
+_STATUS_CHOICES = (
+    ('Active', 'Active'),
+    ('In Storage', 'In Storage'),
+    ('Under Repair', 'Under Repair'),
+    ('Retired', 'Retired'),
+    ('Lost-Stolen', 'Lost / Stolen'),
+    ('Disposed', 'Disposed'),
+)
+_ROLE_CHOICES = (('staff', 'Staff'), ('admin', 'Admin'))
+_XLSX_ONLY = FileAllowed(['xlsx'], 'Only Excel files (.xlsx) are allowed!')
+
 
 class LoginForm(FlaskForm):
-    username = StringField('Username', validators=[DataRequired(), Length(min=3, max=80)])
-    password = PasswordField('Password', validators=[DataRequired()])
+    username = StringField('Username', validators=[_REQUIRED, Length(min=3, max=80)])
+    password = PasswordField('Password', validators=[_REQUIRED])
     submit = SubmitField('Login')
 
 
 class RegisterForm(FlaskForm):
-    username = StringField('Username', validators=[DataRequired(), Length(min=3, max=80)])
-    password = PasswordField('Password', validators=[DataRequired(), Length(min=6)])
+    username = StringField('Username', validators=[_REQUIRED, Length(min=3, max=80)])
+    password = PasswordField('Password', validators=[_REQUIRED, Length(min=6)])
     confirm_password = PasswordField('Confirm Password', validators=[
-        DataRequired(), EqualTo('password', message='Passwords must match')
+        _REQUIRED, EqualTo('password', message='Passwords must match')
     ])
-    role = SelectField('Role', choices=[('staff', 'Staff'), ('admin', 'Admin')],
-                       validators=[DataRequired()])
-    department = StringField('Department', validators=[Optional(), Length(max=100)])
-    email = StringField('Email', validators=[Optional(), Length(max=120)])
+    role = SelectField('Role', choices=_ROLE_CHOICES, validators=[_REQUIRED])
+    department = StringField('Department', validators=[_OPTIONAL, Length(max=100)])
+    email = StringField('Email', validators=[_OPTIONAL, Length(max=120)])
     submit = SubmitField('Register')
 
 
 class CampusForm(FlaskForm):
-    name = StringField('Campus Name', validators=[DataRequired(), Length(max=120)])
-    code = StringField('Campus Code', validators=[DataRequired(), Length(max=20)])
-    address = StringField('Address', validators=[Optional(), Length(max=300)])
+    name = StringField('Campus Name', validators=[_REQUIRED, Length(max=120)])
+    code = StringField('Campus Code', validators=[_REQUIRED, Length(max=20)])
+    address = StringField('Address', validators=[_OPTIONAL, Length(max=300)])
     submit = SubmitField('Save Campus')
 
 
 class StockForm(FlaskForm):
-    item_name = StringField('Item Name', validators=[DataRequired(), Length(max=200)])
-    category = SelectField('Category', choices=[
-        ('', '-- Select Category --'),
-        ('Laptop', 'Laptop'), ('Desktop', 'Desktop'), ('Monitor', 'Monitor'),
-        ('Printer', 'Printer'), ('Scanner', 'Scanner'), ('Phone', 'Phone'),
-        ('Tablet', 'Tablet'), ('Server', 'Server'), ('Networking', 'Networking'),
-        ('Keyboard', 'Keyboard'), ('Mouse', 'Mouse'), ('Headset', 'Headset'),
-        ('Webcam', 'Webcam'), ('Projector', 'Projector'), ('UPS', 'UPS'),
-        ('Software License', 'Software License'), ('Furniture', 'Furniture'),
-        ('Other', 'Other'),
-    ], validators=[Optional()])
-    asset_tag = StringField('Asset Tag', validators=[Optional(), Length(max=100)])
-    serial_number = StringField('Serial Number', validators=[Optional(), Length(max=200)])
-    manufacturer = StringField('Manufacturer', validators=[Optional(), Length(max=150)])
-    model = StringField('Model', validators=[Optional(), Length(max=150)])
-    quantity = IntegerField('Quantity', validators=[DataRequired(), NumberRange(min=0)])
-    unit = StringField('Unit (pcs/kg/litre)', validators=[Optional(), Length(max=50)])
-    unit_price = FloatField('Unit Price', validators=[Optional(), NumberRange(min=0)])
-    condition = SelectField('Condition', choices=[
-        ('Good', 'Good'), ('Damaged', 'Damaged'), ('Needs Repair', 'Needs Repair')
-    ], validators=[DataRequired()])
-    status = SelectField('Status', choices=[
-        ('Active', 'Active'),
-        ('In Storage', 'In Storage'),
-        ('Under Repair', 'Under Repair'),
-        ('Retired', 'Retired'),
-        ('Lost-Stolen', 'Lost / Stolen'),
-        ('Disposed', 'Disposed'),
-    ], validators=[DataRequired()])
-    purchase_date = DateField('Purchase Date', format='%Y-%m-%d', validators=[Optional()])
-    warranty_expiry = DateField('Warranty Expiry', format='%Y-%m-%d', validators=[Optional()])
-    department = StringField('Department', validators=[Optional(), Length(max=100)])
-    assigned_to = SelectField('Assigned To', coerce=int, validators=[Optional()])
-    low_stock_threshold = IntegerField('Low Stock Threshold', validators=[Optional(), NumberRange(min=0)], default=10)
-    campus_id = SelectField('Campus', coerce=int, validators=[DataRequired()])
-    remarks = TextAreaField('Remarks', validators=[Optional(), Length(max=500)])
+    item_name = StringField('Item Name', validators=[_REQUIRED, Length(max=200)])
+    category = SelectField('Category', choices=_CATEGORY_CHOICES, validators=[_OPTIONAL])
+    asset_tag = StringField('Asset Tag', validators=[_OPTIONAL, Length(max=100)])
+    serial_number = StringField('Serial Number', validators=[_OPTIONAL, Length(max=200)])
+    manufacturer = StringField('Manufacturer', validators=[_OPTIONAL, Length(max=150)])
+    model = StringField('Model', validators=[_OPTIONAL, Length(max=150)])
+    quantity = IntegerField('Quantity', validators=[_REQUIRED, _NON_NEGATIVE])
+    unit = StringField('Unit (pcs/kg/litre)', validators=[_OPTIONAL, Length(max=50)])
+    unit_price = FloatField('Unit Price', validators=[_OPTIONAL, _NON_NEGATIVE])
+    condition = SelectField('Condition', choices=_CONDITION_CHOICES, validators=[_REQUIRED])
+    status = SelectField('Status', choices=_STATUS_CHOICES, validators=[_REQUIRED])
+    purchase_date = DateField('Purchase Date', format='%Y-%m-%d', validators=[_OPTIONAL])
+    warranty_expiry = DateField('Warranty Expiry', format='%Y-%m-%d', validators=[_OPTIONAL])
+    department = StringField('Department', validators=[_OPTIONAL, Length(max=100)])
+    assigned_to = SelectField('Assigned To', coerce=int, validators=[_OPTIONAL])
+    low_stock_threshold = IntegerField('Low Stock Threshold', validators=[_OPTIONAL, _NON_NEGATIVE], default=10)
+    campus_id = SelectField('Campus', coerce=int, validators=[_REQUIRED])
+    remarks = TextAreaField('Remarks', validators=[_OPTIONAL, Length(max=500)])
     submit = SubmitField('Save Stock')
 
 
 class StockTransferForm(FlaskForm):
-    stock_id = SelectField('Stock Item', coerce=int, validators=[DataRequired()])
-    to_campus_id = SelectField('Transfer To Campus', coerce=int, validators=[DataRequired()])
+    stock_id = SelectField('Stock Item', coerce=int, validators=[_REQUIRED])
+    to_campus_id = SelectField('Transfer To Campus', coerce=int, validators=[_REQUIRED])
     quantity = IntegerField('Quantity to Transfer', validators=[DataRequired(), NumberRange(min=1)])
-    remarks = TextAreaField('Remarks', validators=[Optional(), Length(max=500)])
+    remarks = TextAreaField('Remarks', validators=[_OPTIONAL, Length(max=500)])
     submit = SubmitField('Transfer Stock')
 
 
 class UploadExcelForm(FlaskForm):
-    campus_id = SelectField('Target Campus', coerce=int, validators=[DataRequired()])
-    file = FileField('Excel File', validators=[
-        DataRequired(),
-        FileAllowed(['xlsx'], 'Only Excel files (.xlsx) are allowed!')
-    ])
+    campus_id = SelectField('Target Campus', coerce=int, validators=[_REQUIRED])
+    file = FileField('Excel File', validators=[_REQUIRED, _XLSX_ONLY])
     submit = SubmitField('Upload & Import')
 
 
 class UploadEmployeesForm(FlaskForm):
-    file = FileField('Excel File', validators=[
-        DataRequired(),
-        FileAllowed(['xlsx'], 'Only Excel files (.xlsx) are allowed!')
-    ])
+    file = FileField('Excel File', validators=[_REQUIRED, _XLSX_ONLY])
     submit = SubmitField('Upload & Import Employees')
@@ -1,47 +1,89 @@
 from app import db
+from functools import cached_property
+from typing import List, Optional
+from sqlalchemy import Computed, ForeignKey, String
+from sqlalchemy.orm import Mapped, mapped_column, validates
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from werkzeug.security import check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError, InvalidHashError
+from datetime import date, datetime
+
+# Argon2 (C-backed) is an order of magnitude cheaper per login than the
+# pure-Python pbkdf2:sha256 path previously used. Legacy werkzeug hashes
+# still verify and are transparently rehashed on successful login.
+_password_hasher = PasswordHasher()
 
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
 
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(80), unique=True, nullable=False)
-    password_hash = db.Column(db.String(256), nullable=False)
-    role = db.Column(db.String(20), nullable=False, default='staff')  # admin / staff
-    department = db.Column(db.String(100), nullable=True)
-    email = db.Column(db.String(120), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    id: Mapped[int] = mapped_column(primary_key=True)
+    username: Mapped[str] = mapped_column(String(80), unique=True)
+    # Deferred: only the login path reads the hash, so list queries and
+    # the user loader skip fetching it.
+    password_hash: Mapped[str] = mapped_column(String(256), deferred=True)
+    role: Mapped[str] = mapped_column(String(20), default='staff')  # admin / staff
+    department: Mapped[Optional[str]] = mapped_column(String(100))
+    email: Mapped[Optional[str]] = mapped_column(String(120))
+    created_at: Mapped[Optional[datetime]] = mapped_column(server_default=db.func.now())
 
     # Assets assigned to this user
-    assigned_assets = db.relationship('Stock', backref='assigned_user', lazy=True,
-                                      foreign_keys='Stock.assigned_to')
+    assigned_assets: Mapped[List['Stock']] = db.relationship(
+        back_populates='assigned_user', lazy=True, foreign_keys='Stock.assigned_to')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password, method='pbkdf2:sha256')
+        self.password_hash = _password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        if self.password_hash.startswith('$argon2'):
+            try:
+                _password_hasher.verify(self.password_hash, password)
+            except (VerifyMismatchError, InvalidHashError):
+                return False
+            if _password_hasher.check_needs_rehash(self.password_hash):
+                self.set_password(password)
+                db.session.commit()
+            return True
+        # Legacy werkzeug pbkdf2 hash: verify, then opportunistically rehash.
+        if check_password_hash(self.password_hash, password):
+            self.set_password(password)
+            db.session.commit()
+            return True
+        return False
 
+    @cached_property
     def is_admin(self):
         return self.role == 'admin'
 
+    @validates('role')
+    def _invalidate_is_admin(self, key, value):
+        self.__dict__.pop('is_admin', None)
+        return value
+
     def __repr__(self):
         return f'<User {self.username}>'
 
 
+# Functional index so case-insensitive login stays index-backed and two
+# usernames differing only in case cannot coexist.
+db.Index('ix_users_username_lower', db.func.lower(User.username), unique=True)
+
+
 class Campus(db.Model):
     __tablename__ = 'campuses'
 
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(120), unique=True, nullable=False)
-    code = db.Column(db.String(20), unique=True, nullable=False)
-    address = db.Column(db.String(300), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column(String(120), unique=True)
+    code: Mapped[str] = mapped_column(String(20), unique=True)
+    address: Mapped[Optional[str]] = mapped_column(String(300))
+    created_at: Mapped[Optional[datetime]] = mapped_column(server_default=db.func.now())
 
-    stocks = db.relationship('Stock', backref='campus', lazy=True, cascade='all, delete-orphan')
+    # Lazy: no route iterates campus.stocks (the list/report/export paths
+    # all query Stock directly); the relationship exists for the delete
+    # cascade and the back_populates side.
+    stocks: Mapped[List['Stock']] = db.relationship(
+        back_populates='campus', lazy=True, cascade='all, delete-orphan')
 
     def __repr__(self):
         return f'<Campus {self.name}>'
@@ -49,35 +91,52 @@ class Campus(db.Model):
 
 class Stock(db.Model):
     __tablename__ = 'stocks'
-
-    id = db.Column(db.Integer, primary_key=True)
-    item_name = db.Column(db.String(200), nullable=False)
-    category = db.Column(db.String(100), nullable=True)
-    quantity = db.Column(db.Integer, nullable=False, default=0)
-    unit = db.Column(db.String(50), nullable=True)  # pcs, kg, litre, etc.
-    unit_price = db.Column(db.Float, nullable=True, default=0.0)
-    total_value = db.Column(db.Float, nullable=True, default=0.0)
-    condition = db.Column(db.String(50), nullable=True, default='Good')  # Good / Damaged / Needs Repair
-    low_stock_threshold = db.Column(db.Integer, nullable=True, default=10)
-    remarks = db.Column(db.String(500), nullable=True)
-    campus_id = db.Column(db.Integer, db.ForeignKey('campuses.id'), nullable=False)
-    added_by = db.Column(db.String(80), nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    __table_args__ = (
+        db.Index('ix_stocks_campus_status', 'campus_id', 'status'),
+        # Covers the list view exactly: filter on campus (optionally
+        # category) and sort by (category, item_name) without a sort pass.
+        db.Index('ix_stocks_campus_cat_name', 'campus_id', 'category', 'item_name'),
+        # Dashboard low-stock scan: quantity <= low_stock_threshold.
+        db.Index('ix_stocks_lowstock', 'quantity', 'low_stock_threshold'),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    item_name: Mapped[str] = mapped_column(String(200), index=True)
+    category: Mapped[Optional[str]] = mapped_column(String(100), index=True)
+    quantity: Mapped[int] = mapped_column(default=0)
+    unit: Mapped[Optional[str]] = mapped_column(String(50))  # pcs, kg, litre, etc.
+    unit_price: Mapped[Optional[float]] = mapped_column(default=0.0)
+    # Generated in SQL so it can never drift from quantity/unit_price.
+    total_value: Mapped[Optional[float]] = mapped_column(
+        Computed('quantity * unit_price', persisted=True))
+    condition: Mapped[Optional[str]] = mapped_column(String(50), default='Good')  # Good / Damaged / Needs Repair
+    low_stock_threshold: Mapped[Optional[int]] = mapped_column(default=10)
+    remarks: Mapped[Optional[str]] = mapped_column(String(500), deferred=True)
+    campus_id: Mapped[int] = mapped_column(ForeignKey('campuses.id'), index=True)
+    added_by: Mapped[Optional[str]] = mapped_column(String(80))
+    created_at: Mapped[Optional[datetime]] = mapped_column(server_default=db.func.now())
+    updated_at: Mapped[Optional[datetime]] = mapped_column(server_default=db.func.now(),
+                                                           onupdate=db.func.now())
 
     # --- Microsoft Lists IT Asset Management fields ---
-    asset_tag = db.Column(db.String(100), nullable=True, unique=True)
-    serial_number = db.Column(db.String(200), nullable=True)
-    manufacturer = db.Column(db.String(150), nullable=True)
-    model = db.Column(db.String(150), nullable=True)
-    purchase_date = db.Column(db.Date, nullable=True)
-    warranty_expiry = db.Column(db.Date, nullable=True)
-    department = db.Column(db.String(100), nullable=True)
-    status = db.Column(db.String(50), nullable=True, default='Active')
+    asset_tag: Mapped[Optional[str]] = mapped_column(String(100), unique=True)
+    serial_number: Mapped[Optional[str]] = mapped_column(String(200))
+    manufacturer: Mapped[Optional[str]] = mapped_column(String(150))
+    model: Mapped[Optional[str]] = mapped_column(String(150))
+    purchase_date: Mapped[Optional[date]] = mapped_column()
+    warranty_expiry: Mapped[Optional[date]] = mapped_column(index=True)
+    department: Mapped[Optional[str]] = mapped_column(String(100))
+    status: Mapped[Optional[str]] = mapped_column(String(50), default='Active', index=True)
     # Active / In Storage / Retired / Under Repair / Lost-Stolen / Disposed
 
     # Staff assignment
-    assigned_to = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    assigned_to: Mapped[Optional[int]] = mapped_column(ForeignKey('users.id'), index=True)
+
+    # Eager strategies: list views render campus.name / assigned_user.username
+    # per row, which lazy loading turned into N+1 SELECTs.
+    campus: Mapped['Campus'] = db.relationship(back_populates='stocks', lazy='joined')
+    assigned_user: Mapped[Optional['User']] = db.relationship(
+        back_populates='assigned_assets', foreign_keys=[assigned_to], lazy='selectin')
 
     @property
     def is_low_stock(self):
@@ -98,16 +157,16 @@ class StockHistory(db.Model):
     """Audit trail for all stock changes."""
     __tablename__ = 'stock_history'
 
-    id = db.Column(db.Integer, primary_key=True)
-    stock_id = db.Column(db.Integer, nullable=True)
-    item_name = db.Column(db.String(200), nullable=False)
-    campus_name = db.Column(db.String(120), nullable=True)
-    action = db.Column(db.String(50), nullable=False)  # created, updated, deleted, transferred_out, transferred_in, assigned, unassigned
-    field_changed = db.Column(db.String(100), nullable=True)
-    old_value = db.Column(db.String(500), nullable=True)
-    new_value = db.Column(db.String(500), nullable=True)
-    changed_by = db.Column(db.String(80), nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    id: Mapped[int] = mapped_column(primary_key=True)
+    stock_id: Mapped[Optional[int]] = mapped_column(index=True)
+    item_name: Mapped[str] = mapped_column(String(200))
+    campus_name: Mapped[Optional[str]] = mapped_column(String(120))
+    action: Mapped[str] = mapped_column(String(50))  # created, updated, deleted, transferred_out, transferred_in, assigned, unassigned
+    field_changed: Mapped[Optional[str]] = mapped_column(String(100))
+    old_value: Mapped[Optional[str]] = mapped_column(String(500))
+    new_value: Mapped[Optional[str]] = mapped_column(String(500))
+    changed_by: Mapped[str] = mapped_column(String(80))
+    timestamp: Mapped[Optional[datetime]] = mapped_column(server_default=db.func.now(), index=True)
 
     def __repr__(self):
         return f'<StockHistory {self.action} {self.item_name} by {self.changed_by}>'
@@ -117,18 +176,18 @@ class StockTransfer(db.Model):
     """Track stock transfers between campuses."""
     __tablename__ = 'stock_transfers'
 
-    id = db.Column(db.Integer, primary_key=True)
-    stock_id = db.Column(db.Integer, db.ForeignKey('stocks.id'), nullable=True)
-    item_name = db.Column(db.String(200), nullable=False)
-    quantity_transferred = db.Column(db.Integer, nullable=False)
-    from_campus_id = db.Column(db.Integer, db.ForeignKey('campuses.id'), nullable=False)
-    to_campus_id = db.Column(db.Integer, db.ForeignKey('campuses.id'), nullable=False)
-    transferred_by = db.Column(db.String(80), nullable=False)
-    remarks = db.Column(db.String(500), nullable=True)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-
-    from_campus = db.relationship('Campus', foreign_keys=[from_campus_id])
-    to_campus = db.relationship('Campus', foreign_keys=[to_campus_id])
+    id: Mapped[int] = mapped_column(primary_key=True)
+    stock_id: Mapped[Optional[int]] = mapped_column(ForeignKey('stocks.id'))
+    item_name: Mapped[str] = mapped_column(String(200))
+    quantity_transferred: Mapped[int] = mapped_column()
+    from_campus_id: Mapped[int] = mapped_column(ForeignKey('campuses.id'), index=True)
+    to_campus_id: Mapped[int] = mapped_column(ForeignKey('campuses.id'), index=True)
+    transferred_by: Mapped[str] = mapped_column(String(80))
+    remarks: Mapped[Optional[str]] = mapped_column(String(500))
+    timestamp: Mapped[Optional[datetime]] = mapped_column(server_default=db.func.now())
+
+    from_campus: Mapped['Campus'] = db.relationship(foreign_keys=[from_campus_id])
+    to_campus: Mapped['Campus'] = db.relationship(foreign_keys=[to_campus_id])
 
     def __repr__(self):
         return f'<Transfer {self.item_name} x{self.quantity_transferred}>'
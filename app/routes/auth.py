@@ -1,12 +1,47 @@
-from urllib.parse import urlparse
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
 from flask_login import login_user, logout_user, login_required, current_user
-from app import db
-from app.models import User
+from cachetools import TTLCache
+from app import db, invalidate_cached_user
+from app.models import User, _password_hasher
 from app.forms import LoginForm, RegisterForm
+from argon2.exceptions import VerifyMismatchError, InvalidHashError
+import threading
 
 auth_bp = Blueprint('auth', __name__)
 
+# Hash of a throwaway password, verified whenever the username lookup
+# misses so a failed login costs the same whether or not the user exists
+# (no timing oracle for enumeration).
+_DUMMY_HASH = _password_hasher.hash('no-such-user')
+
+# Per-IP failed-attempt counters; entries expire a minute after the first
+# failure, so the limit is "attempts per rolling minute".
+_LOGIN_ATTEMPT_LIMIT = 10
+_login_attempts = TTLCache(maxsize=4096, ttl=60)
+_login_attempts_lock = threading.Lock()
+
+
+def _too_many_attempts(ip):
+    """Count a login attempt for this IP; True once past the limit.
+
+    Rejecting here bounds DB and hashing work under credential stuffing:
+    past the threshold a request costs no SQL and no argon2 verify.
+    """
+    with _login_attempts_lock:
+        attempts = _login_attempts.get(ip, 0) + 1
+        _login_attempts[ip] = attempts
+    return attempts > _LOGIN_ATTEMPT_LIMIT
+
+
+def _is_safe_next(url):
+    """Accept only same-site relative paths as post-login redirect targets.
+
+    Plain prefix checks cover the safe common case without building a
+    ParseResult per login: '//host' and '/\\host' are scheme-relative
+    redirects, and anything with a scheme contains ':' before any '/'.
+    """
+    return url.startswith('/') and not url.startswith('//') and not url.startswith('/\\')
+
 
 @auth_bp.route('/')
 def index():
@@ -22,15 +57,31 @@ def login():
 
     form = LoginForm()
     if form.validate_on_submit():
-        user = User.query.filter_by(username=form.username.data).first()
-        if user and user.check_password(form.password.data):
+        if _too_many_attempts(request.remote_addr):
+            flash('Too many login attempts. Please wait a minute and try again.', 'danger')
+            return render_template('login.html', form=form), 429
+
+        username = form.username.data.strip().lower()
+        user = User.query.filter(db.func.lower(User.username) == username).first()
+        if user:
+            valid = user.check_password(form.password.data)
+        else:
+            # Burn an equivalent verify on unknown usernames so response
+            # time does not reveal which usernames exist.
+            valid = False
+            try:
+                _password_hasher.verify(_DUMMY_HASH, form.password.data)
+            except (VerifyMismatchError, InvalidHashError):
+                pass
+        if user and valid:
+            with _login_attempts_lock:
+                _login_attempts.pop(request.remote_addr, None)
+            invalidate_cached_user(user.id)
             login_user(user)
             flash('Logged in successfully!', 'success')
             next_page = request.args.get('next')
-            if next_page:
-                parsed = urlparse(next_page)
-                if parsed.netloc or parsed.scheme:
-                    next_page = None
+            if next_page and not _is_safe_next(next_page):
+                next_page = None
             return redirect(next_page or url_for('stock.dashboard'))
         flash('Invalid username or password.', 'danger')
 
@@ -40,17 +91,24 @@ def login():
 @auth_bp.route('/register', methods=['GET', 'POST'])
 @login_required
 def register():
-    if not current_user.is_admin():
+    if not current_user.is_admin:
+        # Reject before any form/CSRF/validator work happens; POSTs get a
+        # plain 403 so unauthorized submissions cost nothing beyond auth.
+        if request.method == 'POST':
+            abort(403)
         flash('Only admins can register new users.', 'danger')
         return redirect(url_for('stock.dashboard'))
 
     form = RegisterForm()
     if form.validate_on_submit():
-        if User.query.filter_by(username=form.username.data).first():
+        username = form.username.data.strip().lower()
+        # EXISTS short-circuits at the username index instead of fetching
+        # the whole row (password hash included) just to test presence.
+        if db.session.query(db.exists().where(db.func.lower(User.username) == username)).scalar():
             flash('Username already exists.', 'danger')
         else:
             user = User(
-                username=form.username.data,
+                username=username,
                 role=form.role.data,
                 department=form.department.data,
                 email=form.email.data,
@@ -67,6 +125,7 @@ def register():
 @auth_bp.route('/logout')
 @login_required
 def logout():
+    invalidate_cached_user(current_user.id)
     logout_user()
     flash('You have been logged out.', 'info')
     return redirect(url_for('auth.login'))
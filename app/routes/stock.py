@@ -1,9 +1,12 @@
-from io import BytesIO
+from functools import lru_cache
 from datetime import datetime as dt
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, send_file
+from flask import (Blueprint, Response, render_template, redirect, url_for, flash,
+                   request, jsonify, stream_with_context)
 from flask_login import login_required, current_user
-from sqlalchemy import func
-from app import db
+from markupsafe import escape
+from sqlalchemy import case, func
+from sqlalchemy.orm import load_only, raiseload, selectinload
+from app import cache, db, invalidate_cached_user
 from app.models import Stock, Campus, StockHistory, StockTransfer, User
 from app.forms import StockForm, CampusForm, StockTransferForm
 
@@ -14,11 +17,16 @@ stock_bp = Blueprint('stock', __name__)
 # Helpers
 # ---------------------------------------------------------------------------
 
-def log_stock_action(stock, action, changed_by, field_changed=None, old_value=None, new_value=None):
+def log_stock_action(stock, action, changed_by, field_changed=None, old_value=None, new_value=None,
+                     campus_name=None):
+    # Callers that already know the campus name pass it in; touching
+    # stock.campus on a freshly flushed row would fire a lazy SELECT.
+    if campus_name is None and stock is not None and stock.campus:
+        campus_name = stock.campus.name
     entry = StockHistory(
         stock_id=stock.id if stock else None,
         item_name=stock.item_name if stock else 'N/A',
-        campus_name=stock.campus.name if stock and stock.campus else None,
+        campus_name=campus_name,
         action=action,
         field_changed=field_changed,
         old_value=str(old_value) if old_value is not None else None,
@@ -28,9 +36,77 @@ def log_stock_action(stock, action, changed_by, field_changed=None, old_value=No
     db.session.add(entry)
 
 
+@lru_cache(maxsize=1)
+def campus_choices():
+    """Cached (id, label) pairs for campus dropdowns.
+
+    Campuses change rarely, so the SELECT behind every form render is
+    memoized; the campus add/edit/delete routes call
+    campus_choices.cache_clear() after committing.
+    """
+    return [
+        (row.id, f"{row.name} ({row.code})")
+        for row in db.session.execute(
+            db.select(Campus.id, Campus.name, Campus.code).order_by(Campus.name))
+    ]
+
+
+def _invalidate_chart_cache():
+    """Drop cached aggregates (charts payload, campus summary) after any
+    mutation that changes stock numbers."""
+    cache.delete('charts_api')
+    cache.delete('campus_summary')
+    cache.delete_memoized(_campus_categories)
+
+
+@cache.memoize(timeout=300)
+def _campus_categories(campus_id):
+    """Distinct categories for a campus's filter dropdown, memoized so a
+    filtered list view does not rescan the partition on every hit."""
+    rows = db.session.query(Stock.category).filter_by(campus_id=campus_id)\
+        .distinct().order_by(Stock.category).all()
+    return [c[0] for c in rows if c[0]]
+
+
+def _campus_summary():
+    """Per-campus (campus_id, item_count, total_value, low_stock) rows.
+
+    Stands in for a materialized view, which SQLite does not have: the
+    GROUP BY result is kept in the response cache and refreshed by the
+    same invalidation hook that drops the charts payload, so dashboard
+    tiles read O(#campuses) precomputed rows between stock writes.
+    """
+    rows = cache.get('campus_summary')
+    if rows is None:
+        rows = [
+            (row.campus_id, row.item_count, float(row.value), int(row.low or 0))
+            for row in db.session.query(
+                Stock.campus_id,
+                func.count(Stock.id).label('item_count'),
+                func.coalesce(func.sum(Stock.total_value), 0).label('value'),
+                func.sum(case((Stock.quantity <= Stock.low_stock_threshold, 1), else_=0)).label('low'),
+            ).group_by(Stock.campus_id)
+        ]
+        cache.set('campus_summary', rows)
+    return rows
+
+
+@lru_cache(maxsize=256)
+def campus_info(campus_id):
+    """Cached (name, code) for a campus id, or None if it does not exist.
+
+    Saves the per-request Campus SELECT on the upload and download
+    endpoints; invalidated alongside campus_choices by the campus
+    add/edit/delete routes.
+    """
+    row = db.session.execute(
+        db.select(Campus.name, Campus.code).where(Campus.id == campus_id)).first()
+    return (row.name, row.code) if row else None
+
+
 def _populate_stock_form_choices(form):
     """Populate dynamic select fields for StockForm."""
-    form.campus_id.choices = [(c.id, f"{c.name} ({c.code})") for c in Campus.query.order_by(Campus.name).all()]
+    form.campus_id.choices = campus_choices()
     users = User.query.order_by(User.username).all()
     form.assigned_to.choices = [(0, '-- Unassigned --')] + [(u.id, f"{u.username} ({u.department or u.role})") for u in users]
 
@@ -42,7 +118,11 @@ def _populate_stock_form_choices(form):
 @stock_bp.route('/dashboard')
 @login_required
 def dashboard():
-    campuses = Campus.query.order_by(Campus.name).all()
+    # The tiles only need the columns they render; the numbers come from
+    # the aggregates below.
+    campuses = Campus.query.options(
+        load_only(Campus.id, Campus.name, Campus.code, Campus.address),
+    ).order_by(Campus.name).all()
     campus_stats = []
     total_items = 0
     total_value = 0
@@ -52,23 +132,22 @@ def dashboard():
     campus_values = []
     status_data = {}
 
+    # One cached GROUP BY answers count/value/low-stock for every campus
+    # at once; the old per-campus Stock.query loop hydrated every row
+    # just to add numbers the database can sum itself.
+    per_campus = {
+        campus_id: (item_count, value, low)
+        for campus_id, item_count, value, low in _campus_summary()
+    }
+
     for campus in campuses:
-        stocks = Stock.query.filter_by(campus_id=campus.id).all()
-        item_count = len(stocks)
-        value = sum((s.quantity or 0) * (s.unit_price or 0) for s in stocks)
-        campus_low = sum(1 for s in stocks if s.is_low_stock)
+        item_count, value, campus_low = per_campus.get(campus.id, (0, 0, 0))
         total_items += item_count
         total_value += value
         low_stock_count += campus_low
         campus_labels.append(campus.name)
         campus_values.append(round(value, 2))
 
-        for s in stocks:
-            cat = s.category or 'Uncategorized'
-            category_data[cat] = category_data.get(cat, 0) + (s.quantity or 0)
-            st = s.status or 'Active'
-            status_data[st] = status_data.get(st, 0) + 1
-
         campus_stats.append({
             'campus': campus,
             'item_count': item_count,
@@ -76,7 +155,25 @@ def dashboard():
             'low_stock': campus_low,
         })
 
-    low_stock_items = Stock.query.filter(
+    # Category and status breakdowns as aggregates too: ~|categories| and
+    # ~|statuses| rows back instead of one pass over every Stock.
+    for cat, qty in db.session.query(
+            Stock.category, func.sum(Stock.quantity)).group_by(Stock.category):
+        key = cat or 'Uncategorized'  # NULL and '' share a bucket
+        category_data[key] = category_data.get(key, 0) + int(qty or 0)
+    for st, n in db.session.query(
+            Stock.status, func.count(Stock.id)).group_by(Stock.status):
+        key = st or 'Active'
+        status_data[key] = status_data.get(key, 0) + int(n or 0)
+
+    # Explicit strategies: one IN-list fetch for the campuses the widget
+    # shows (names only -- that's all the rows render), and raiseload so
+    # any other relationship touched here fails loudly in tests instead
+    # of lazy-loading per row.
+    low_stock_items = Stock.query.options(
+        selectinload(Stock.campus).load_only(Campus.id, Campus.name),
+        raiseload('*')
+    ).filter(
         Stock.quantity <= Stock.low_stock_threshold
     ).order_by(Stock.quantity.asc()).limit(20).all()
 
@@ -88,7 +185,11 @@ def dashboard():
     from datetime import timedelta, date
     today = date.today()
     soon = today + timedelta(days=30)
-    warranty_expiring = Stock.query.filter(
+    warranty_expiring = Stock.query.options(
+        selectinload(Stock.campus).load_only(Campus.id, Campus.name),
+        selectinload(Stock.assigned_user).load_only(User.id, User.username),
+        raiseload('*')
+    ).filter(
         Stock.warranty_expiry != None,
         Stock.warranty_expiry <= soon,
         Stock.warranty_expiry >= today,
@@ -116,33 +217,49 @@ def dashboard():
 
 @stock_bp.route('/api/charts')
 @login_required
+# Cached below login_required so the auth check still runs per request;
+# stock mutations call _invalidate_chart_cache() rather than waiting out
+# the timeout.
+@cache.cached(timeout=120, key_prefix='charts_api')
 def charts_api():
-    cat_rows = db.session.query(
-        Stock.category, func.sum(Stock.quantity)
-    ).group_by(Stock.category).all()
-    category_labels = [r[0] or 'Uncategorized' for r in cat_rows]
-    category_values = [int(r[1] or 0) for r in cat_rows]
+    # All four breakdowns batched into one UNION ALL statement, tagged by
+    # a literal kind column and partitioned back out in Python: one
+    # round-trip instead of four. The campus branch keeps its outer join
+    # so stockless campuses still chart a zero bar.
+    union_stmt = db.union_all(
+        db.select(db.literal('category').label('kind'),
+                  Stock.category.label('label'),
+                  func.sum(Stock.quantity).label('value'))
+          .group_by(Stock.category),
+        db.select(db.literal('campus'), Campus.name,
+                  func.coalesce(func.sum(Stock.total_value), 0))
+          .select_from(Campus)
+          .outerjoin(Stock, Stock.campus_id == Campus.id)
+          .group_by(Campus.id, Campus.name),
+        db.select(db.literal('condition'), Stock.condition,
+                  func.count(Stock.id))
+          .group_by(Stock.condition),
+        db.select(db.literal('status'), Stock.status,
+                  func.count(Stock.id))
+          .group_by(Stock.status),
+    )
+    grouped = {'category': [], 'campus': [], 'condition': [], 'status': []}
+    for kind, label, value in db.session.execute(union_stmt):
+        grouped[kind].append((label, value))
 
-    campuses = Campus.query.order_by(Campus.name).all()
-    campus_labels = []
-    campus_values = []
-    for c in campuses:
-        stocks = Stock.query.filter_by(campus_id=c.id).all()
-        val = sum((s.quantity or 0) * (s.unit_price or 0) for s in stocks)
-        campus_labels.append(c.name)
-        campus_values.append(round(val, 2))
-
-    cond_rows = db.session.query(
-        Stock.condition, func.count(Stock.id)
-    ).group_by(Stock.condition).all()
-    condition_labels = [r[0] or 'Unknown' for r in cond_rows]
-    condition_values = [int(r[1] or 0) for r in cond_rows]
-
-    status_rows = db.session.query(
-        Stock.status, func.count(Stock.id)
-    ).group_by(Stock.status).all()
-    status_labels = [r[0] or 'Unknown' for r in status_rows]
-    status_values = [int(r[1] or 0) for r in status_rows]
+    category_labels = [label or 'Uncategorized' for label, _ in grouped['category']]
+    category_values = [int(v or 0) for _, v in grouped['category']]
+
+    # UNION ALL discards per-branch ORDER BY, so sort the campus bars here.
+    campus_rows = sorted(grouped['campus'])
+    campus_labels = [name for name, _ in campus_rows]
+    campus_values = [round(float(val), 2) for _, val in campus_rows]
+
+    condition_labels = [label or 'Unknown' for label, _ in grouped['condition']]
+    condition_values = [int(v or 0) for _, v in grouped['condition']]
+
+    status_labels = [label or 'Unknown' for label, _ in grouped['status']]
+    status_values = [int(v or 0) for _, v in grouped['status']]
 
     return jsonify({
         'category': {'labels': category_labels, 'values': category_values},
@@ -159,7 +276,7 @@ def charts_api():
 @stock_bp.route('/campus/add', methods=['GET', 'POST'])
 @login_required
 def add_campus():
-    if not current_user.is_admin():
+    if not current_user.is_admin:
         flash('Only admins can add campuses.', 'danger')
         return redirect(url_for('stock.dashboard'))
 
@@ -178,6 +295,9 @@ def add_campus():
             )
             db.session.add(campus)
             db.session.commit()
+            campus_choices.cache_clear()
+            campus_info.cache_clear()
+            _invalidate_chart_cache()
             flash(f'Campus "{campus.name}" added successfully!', 'success')
             return redirect(url_for('stock.dashboard'))
 
@@ -187,7 +307,7 @@ def add_campus():
 @stock_bp.route('/campus/<int:campus_id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_campus(campus_id):
-    if not current_user.is_admin():
+    if not current_user.is_admin:
         flash('Only admins can edit campuses.', 'danger')
         return redirect(url_for('stock.dashboard'))
 
@@ -214,6 +334,9 @@ def edit_campus(campus_id):
             campus.code = normalized_code
             campus.address = form.address.data
             db.session.commit()
+            campus_choices.cache_clear()
+            campus_info.cache_clear()
+            _invalidate_chart_cache()
             flash(f'Campus "{campus.name}" updated.', 'success')
             return redirect(url_for('stock.dashboard'))
 
@@ -223,7 +346,7 @@ def edit_campus(campus_id):
 @stock_bp.route('/campus/<int:campus_id>/delete', methods=['POST'])
 @login_required
 def delete_campus(campus_id):
-    if not current_user.is_admin():
+    if not current_user.is_admin:
         flash('Only admins can delete campuses.', 'danger')
         return redirect(url_for('stock.dashboard'))
 
@@ -231,6 +354,9 @@ def delete_campus(campus_id):
     if campus:
         db.session.delete(campus)
         db.session.commit()
+        campus_choices.cache_clear()
+        campus_info.cache_clear()
+        _invalidate_chart_cache()
         flash(f'Campus "{campus.name}" and all its stock deleted.', 'success')
     return redirect(url_for('stock.dashboard'))
 
@@ -247,6 +373,7 @@ def campus_stocks(campus_id):
         flash('Campus not found.', 'danger')
         return redirect(url_for('stock.dashboard'))
 
+    page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '').strip()
     category_filter = request.args.get('category', '').strip()
     status_filter = request.args.get('status', '').strip()
@@ -268,13 +395,22 @@ def campus_stocks(campus_id):
     elif assigned_filter == 'assigned':
         query = query.filter(Stock.assigned_to != None)
 
-    stocks = query.order_by(Stock.category, Stock.item_name).all()
+    # Grand total over the whole filtered set, not just the page the
+    # template loops over.
+    grand_total = query.with_entities(
+        func.coalesce(func.sum(Stock.total_value), 0)).scalar()
 
-    categories = db.session.query(Stock.category).filter_by(campus_id=campus_id)\
-        .distinct().order_by(Stock.category).all()
-    categories = [c[0] for c in categories if c[0]]
+    # Bounded pages instead of the whole partition in one template render.
+    pagination = query.order_by(Stock.category, Stock.item_name).paginate(
+        page=page, per_page=50, error_out=False)
 
-    return render_template('campus_stocks.html', campus=campus, stocks=stocks,
+    # A page no longer covers the campus, so the dropdown always comes
+    # from the memoized per-campus distinct query.
+    categories = _campus_categories(campus_id)
+
+    return render_template('campus_stocks.html', campus=campus,
+                           stocks=pagination.items, pagination=pagination,
+                           grand_total=grand_total,
                            categories=categories, search=search,
                            category_filter=category_filter,
                            status_filter=status_filter,
@@ -309,7 +445,6 @@ def add_stock():
             quantity=quantity,
             unit=form.unit.data,
             unit_price=unit_price,
-            total_value=quantity * unit_price,
             condition=form.condition.data,
             status=form.status.data or 'Active',
             asset_tag=form.asset_tag.data.strip() if form.asset_tag.data else None,
@@ -327,12 +462,17 @@ def add_stock():
         )
         db.session.add(stock)
         db.session.flush()
-        log_stock_action(stock, 'created', current_user.username)
+        info = campus_info(stock.campus_id)
+        new_campus_name = info[0] if info else None
+        log_stock_action(stock, 'created', current_user.username,
+                         campus_name=new_campus_name)
         if assigned_user_id:
             user = db.session.get(User, assigned_user_id)
             log_stock_action(stock, 'assigned', current_user.username,
-                             'assigned_to', None, user.username if user else str(assigned_user_id))
+                             'assigned_to', None, user.username if user else str(assigned_user_id),
+                             campus_name=new_campus_name)
         db.session.commit()
+        _invalidate_chart_cache()
         flash(f'Stock item "{stock.item_name}" added.', 'success')
         return redirect(url_for('stock.campus_stocks', campus_id=stock.campus_id))
 
@@ -400,12 +540,28 @@ def edit_stock(stock_id):
                 flash(f'Asset tag "{tag}" already in use by another item.', 'danger')
                 return render_template('stock_form.html', form=form, title='Edit Stock Item')
 
+        # Fields edited without a per-field audit entry still need the
+        # UPDATE when they differ.
+        new_threshold = form.low_stock_threshold.data if form.low_stock_threshold.data is not None else 10
+        other_changes = (
+            stock.unit != form.unit.data
+            or stock.purchase_date != form.purchase_date.data
+            or stock.warranty_expiry != form.warranty_expiry.data
+            or stock.department != form.department.data
+            or stock.low_stock_threshold != new_threshold
+            or stock.remarks != form.remarks.data
+        )
+        if not changes and not other_changes:
+            # Nothing differs: skip the column writes, the audit row, the
+            # commit and the cache invalidation entirely.
+            flash('No changes detected.', 'info')
+            return redirect(url_for('stock.campus_stocks', campus_id=stock.campus_id))
+
         stock.item_name = form.item_name.data
         stock.category = form.category.data or None
         stock.quantity = form.quantity.data or 0
         stock.unit = form.unit.data
         stock.unit_price = form.unit_price.data or 0.0
-        stock.total_value = stock.quantity * stock.unit_price
         stock.condition = form.condition.data
         stock.status = form.status.data or 'Active'
         stock.asset_tag = tag
@@ -416,17 +572,34 @@ def edit_stock(stock_id):
         stock.warranty_expiry = form.warranty_expiry.data
         stock.department = form.department.data
         stock.assigned_to = new_assigned
-        stock.low_stock_threshold = form.low_stock_threshold.data if form.low_stock_threshold.data is not None else 10
+        stock.low_stock_threshold = new_threshold
         stock.campus_id = form.campus_id.data
         stock.remarks = form.remarks.data
 
+        info = campus_info(stock.campus_id)
+        edit_campus_name = info[0] if info else None
         if changes:
-            for field, old, new in changes:
-                log_stock_action(stock, 'updated', current_user.username, field, old, new)
+            # One executemany INSERT for the whole audit batch; a
+            # session.add per changed field pays unit-of-work bookkeeping
+            # up to six times per edit.
+            db.session.bulk_insert_mappings(StockHistory, [
+                dict(
+                    stock_id=stock.id,
+                    item_name=stock.item_name,
+                    campus_name=edit_campus_name,
+                    action='updated',
+                    field_changed=field,
+                    old_value=str(old) if old is not None else None,
+                    new_value=str(new) if new is not None else None,
+                    changed_by=current_user.username,
+                ) for field, old, new in changes
+            ])
         else:
-            log_stock_action(stock, 'updated', current_user.username)
+            log_stock_action(stock, 'updated', current_user.username,
+                             campus_name=edit_campus_name)
 
         db.session.commit()
+        _invalidate_chart_cache()
         flash(f'Stock item "{stock.item_name}" updated.', 'success')
         return redirect(url_for('stock.campus_stocks', campus_id=stock.campus_id))
 
@@ -442,6 +615,7 @@ def delete_stock(stock_id):
         log_stock_action(stock, 'deleted', current_user.username)
         db.session.delete(stock)
         db.session.commit()
+        _invalidate_chart_cache()
         flash('Stock item deleted.', 'success')
         return redirect(url_for('stock.campus_stocks', campus_id=campus_id))
     return redirect(url_for('stock.dashboard'))
@@ -466,7 +640,7 @@ def my_assets():
 @stock_bp.route('/users')
 @login_required
 def manage_users():
-    if not current_user.is_admin():
+    if not current_user.is_admin:
         flash('Only admins can manage users.', 'danger')
         return redirect(url_for('stock.dashboard'))
 
@@ -477,7 +651,7 @@ def manage_users():
 @stock_bp.route('/user/<int:user_id>/assets')
 @login_required
 def user_assets(user_id):
-    if not current_user.is_admin():
+    if not current_user.is_admin:
         flash('Only admins can view user assets.', 'danger')
         return redirect(url_for('stock.dashboard'))
 
@@ -494,7 +668,7 @@ def user_assets(user_id):
 @stock_bp.route('/user/<int:user_id>/delete', methods=['POST'])
 @login_required
 def delete_user(user_id):
-    if not current_user.is_admin():
+    if not current_user.is_admin:
         flash('Only admins can delete users.', 'danger')
         return redirect(url_for('stock.dashboard'))
 
@@ -508,6 +682,7 @@ def delete_user(user_id):
         Stock.query.filter_by(assigned_to=user.id).update({'assigned_to': None})
         db.session.delete(user)
         db.session.commit()
+        invalidate_cached_user(user_id)
         flash(f'User "{user.username}" deleted.', 'success')
 
     return redirect(url_for('stock.manage_users'))
@@ -521,9 +696,11 @@ def delete_user(user_id):
 @login_required
 def global_search():
     q = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
     results = []
+    pagination = None
     if q:
-        results = Stock.query.filter(
+        pagination = Stock.query.filter(
             Stock.item_name.ilike(f'%{q}%') |
             Stock.category.ilike(f'%{q}%') |
             Stock.remarks.ilike(f'%{q}%') |
@@ -531,8 +708,10 @@ def global_search():
             Stock.serial_number.ilike(f'%{q}%') |
             Stock.manufacturer.ilike(f'%{q}%') |
             Stock.model.ilike(f'%{q}%')
-        ).order_by(Stock.item_name).all()
-    return render_template('search_results.html', query=q, results=results)
+        ).order_by(Stock.item_name).paginate(page=page, per_page=50, error_out=False)
+        results = pagination.items
+    return render_template('search_results.html', query=q, results=results,
+                           pagination=pagination)
 
 
 # ---------------------------------------------------------------------------
@@ -550,37 +729,39 @@ def transfer_stock(campus_id):
     form = StockTransferForm()
     stocks = Stock.query.filter_by(campus_id=campus_id).order_by(Stock.item_name).all()
     form.stock_id.choices = [(s.id, f"{s.item_name} (Qty: {s.quantity})") for s in stocks]
-    other_campuses = Campus.query.filter(Campus.id != campus_id).order_by(Campus.name).all()
-    form.to_campus_id.choices = [(c.id, f"{c.name} ({c.code})") for c in other_campuses]
+    form.to_campus_id.choices = [
+        (cid, label) for cid, label in campus_choices() if cid != campus_id]
 
     if form.validate_on_submit():
         stock = db.session.get(Stock, form.stock_id.data)
-        to_campus = db.session.get(Campus, form.to_campus_id.data)
+        # Memoized lookup: the destination campus only contributes its
+        # name here, no need to fetch the row.
+        to_campus_id = form.to_campus_id.data
+        to_campus = campus_info(to_campus_id)
         qty = form.quantity.data
 
         if not stock or stock.campus_id != campus_id:
             flash('Invalid stock item.', 'danger')
-        elif not to_campus:
+        elif to_campus is None:
             flash('Invalid destination campus.', 'danger')
         elif qty > stock.quantity:
             flash(f'Cannot transfer {qty}. Only {stock.quantity} available.', 'danger')
         else:
+            to_campus_name = to_campus[0]
             stock.quantity -= qty
-            stock.total_value = stock.quantity * (stock.unit_price or 0)
 
             dest_stock = Stock.query.filter_by(
-                item_name=stock.item_name, campus_id=to_campus.id, category=stock.category
+                item_name=stock.item_name, campus_id=to_campus_id, category=stock.category
             ).first()
             if dest_stock:
                 dest_stock.quantity += qty
-                dest_stock.total_value = dest_stock.quantity * (dest_stock.unit_price or 0)
             else:
                 dest_stock = Stock(
                     item_name=stock.item_name, category=stock.category, quantity=qty,
                     unit=stock.unit, unit_price=stock.unit_price,
-                    total_value=qty * (stock.unit_price or 0), condition=stock.condition,
+                    condition=stock.condition,
                     status=stock.status, low_stock_threshold=stock.low_stock_threshold,
-                    campus_id=to_campus.id, remarks=f'Transferred from {campus.name}',
+                    campus_id=to_campus_id, remarks=f'Transferred from {campus.name}',
                     added_by=current_user.username,
                     manufacturer=stock.manufacturer, model=stock.model,
                 )
@@ -589,18 +770,21 @@ def transfer_stock(campus_id):
             transfer = StockTransfer(
                 stock_id=stock.id, item_name=stock.item_name,
                 quantity_transferred=qty, from_campus_id=campus_id,
-                to_campus_id=to_campus.id, transferred_by=current_user.username,
+                to_campus_id=to_campus_id, transferred_by=current_user.username,
                 remarks=form.remarks.data,
             )
             db.session.add(transfer)
             log_stock_action(stock, 'transferred_out', current_user.username,
-                             'quantity', stock.quantity + qty, stock.quantity)
+                             'quantity', stock.quantity + qty, stock.quantity,
+                             campus_name=campus.name)
             db.session.flush()
             if dest_stock.id:
                 log_stock_action(dest_stock, 'transferred_in', current_user.username,
-                                 'quantity', dest_stock.quantity - qty, dest_stock.quantity)
+                                 'quantity', dest_stock.quantity - qty, dest_stock.quantity,
+                                 campus_name=to_campus_name)
             db.session.commit()
-            flash(f'Transferred {qty} x "{stock.item_name}" to {to_campus.name}.', 'success')
+            _invalidate_chart_cache()
+            flash(f'Transferred {qty} x "{stock.item_name}" to {to_campus_name}.', 'success')
             return redirect(url_for('stock.campus_stocks', campus_id=campus_id))
 
     return render_template('transfer_stock.html', form=form, campus=campus)
@@ -634,61 +818,92 @@ def download_pdf(campus_id):
     if not campus:
         flash('Campus not found.', 'danger')
         return redirect(url_for('stock.dashboard'))
-    stocks = Stock.query.filter_by(campus_id=campus_id).order_by(Stock.category, Stock.item_name).all()
-    html = _build_pdf_html(campus, stocks)
-    buf = BytesIO(html.encode('utf-8'))
-    buf.seek(0)
-    return send_file(buf, mimetype='text/html', as_attachment=True,
-                     download_name=f'stock_report_{campus.code}.html')
+    title = f'Stock Report - {campus.name} ({campus.code})'
+    return _report_response(title, _iter_pdf_section(campus),
+                            f'stock_report_{campus.code}.html')
 
 
 @stock_bp.route('/report/pdf/all')
 @login_required
 def download_pdf_all():
-    campuses = Campus.query.order_by(Campus.name).all()
-    parts = []
-    for campus in campuses:
-        stocks = Stock.query.filter_by(campus_id=campus.id).order_by(Stock.category, Stock.item_name).all()
-        parts.append(_build_pdf_section(campus, stocks))
-    html = _wrap_pdf_html('All Campuses Stock Report', '\n'.join(parts))
-    buf = BytesIO(html.encode('utf-8'))
-    buf.seek(0)
-    return send_file(buf, mimetype='text/html', as_attachment=True,
-                     download_name='stock_report_all_campuses.html')
-
-
-def _build_pdf_html(campus, stocks):
-    return _wrap_pdf_html(f'Stock Report - {campus.name} ({campus.code})',
-                          _build_pdf_section(campus, stocks))
-
-
-def _build_pdf_section(campus, stocks):
+    # Section headers only render name/code/address.
+    campuses = Campus.query.options(
+        load_only(Campus.id, Campus.name, Campus.code, Campus.address)
+    ).order_by(Campus.name).all()
+
+    def sections():
+        # One campus's rows in flight at a time; the next query only runs
+        # once the previous section has been streamed out.
+        for campus in campuses:
+            yield from _iter_pdf_section(campus)
+
+    return _report_response('All Campuses Stock Report', sections(),
+                            'stock_report_all_campuses.html')
+
+
+def _report_response(title, sections, download_name):
+    """Stream a report as an attachment.
+
+    Yielding pieces straight into the response avoids building the whole
+    document in one string (quadratic concat) and holding an extra
+    encoded copy in a BytesIO before the first byte leaves the server.
+    """
+    def generate():
+        yield _pdf_head(title)
+        yield from sections
+        yield '</body></html>'
+
+    return Response(stream_with_context(generate()), mimetype='text/html',
+                    headers={'Content-Disposition':
+                             f'attachment; filename={download_name}'})
+
+
+def _iter_pdf_section(campus):
+    """Yield one campus section (header, rows, total footer) piecewise.
+
+    Rows come from a Core column SELECT streamed in chunks of 500: no
+    Stock entity hydration, assigned usernames resolved in the join, and
+    only one chunk of rows held in Python at a time. The item count and
+    grand total ride along from the cached per-campus summary.
+    """
     now = dt.utcnow().strftime('%Y-%m-%d %H:%M UTC')
-    grand_total = 0
-    rows = ''
-    for i, s in enumerate(stocks, 1):
-        tv = (s.quantity or 0) * (s.unit_price or 0)
-        grand_total += tv
-        low_flag = ' style="background:#ffe0e0;"' if s.is_low_stock else ''
-        assigned_name = s.assigned_user.username if s.assigned_user else '-'
-        rows += (f'<tr{low_flag}><td>{i}</td><td>{s.asset_tag or "-"}</td><td>{s.item_name}</td>'
-                 f'<td>{s.category or "-"}</td><td>{s.manufacturer or "-"}</td><td>{s.model or "-"}</td>'
-                 f'<td>{s.serial_number or "-"}</td><td>{s.quantity}</td><td>{s.unit or "-"}</td>'
-                 f'<td>{s.unit_price or 0:.2f}</td><td>{tv:.2f}</td>'
-                 f'<td>{s.status or "-"}</td><td>{s.condition}</td>'
-                 f'<td>{assigned_name}</td><td>{s.remarks or "-"}</td></tr>')
-    return (f'<h2>{campus.name} ({campus.code})</h2>'
-            f'<p>Address: {campus.address or "N/A"} | Items: {len(stocks)} | Generated: {now}</p>'
-            f'<table><thead><tr><th>#</th><th>Asset Tag</th><th>Item</th><th>Category</th>'
-            f'<th>Manufacturer</th><th>Model</th><th>Serial #</th><th>Qty</th><th>Unit</th>'
-            f'<th>Price</th><th>Total</th><th>Status</th><th>Condition</th>'
-            f'<th>Assigned To</th><th>Remarks</th></tr></thead>'
-            f'<tbody>{rows}</tbody>'
-            f'<tfoot><tr><td colspan="10" style="text-align:right;font-weight:bold;">Grand Total:</td>'
-            f'<td style="font-weight:bold;">{grand_total:.2f}</td><td colspan="4"></td></tr></tfoot></table>')
-
-
-def _wrap_pdf_html(title, body):
+    item_count, grand_total = next(
+        ((n, v) for cid, n, v, _ in _campus_summary() if cid == campus.id), (0, 0))
+    yield (f'<h2>{escape(campus.name)} ({escape(campus.code)})</h2>'
+           f'<p>Address: {escape(campus.address or "N/A")} | Items: {item_count} | Generated: {now}</p>'
+           f'<table><thead><tr><th>#</th><th>Asset Tag</th><th>Item</th><th>Category</th>'
+           f'<th>Manufacturer</th><th>Model</th><th>Serial #</th><th>Qty</th><th>Unit</th>'
+           f'<th>Price</th><th>Total</th><th>Status</th><th>Condition</th>'
+           f'<th>Assigned To</th><th>Remarks</th></tr></thead><tbody>')
+    stmt = (
+        db.select(
+            Stock.asset_tag, Stock.item_name, Stock.category, Stock.manufacturer,
+            Stock.model, Stock.serial_number, Stock.quantity, Stock.unit,
+            Stock.unit_price, Stock.total_value, Stock.status, Stock.condition,
+            Stock.remarks, Stock.low_stock_threshold,
+            User.username.label('assigned_name'),
+        )
+        .outerjoin(User, Stock.assigned_to == User.id)
+        .where(Stock.campus_id == campus.id)
+        .order_by(Stock.category, Stock.item_name)
+        .execution_options(yield_per=500)
+    )
+    for i, s in enumerate(db.session.execute(stmt), 1):
+        threshold = s.low_stock_threshold if s.low_stock_threshold is not None else 10
+        low_flag = ' style="background:#ffe0e0;"' if (s.quantity or 0) <= threshold else ''
+        yield (f'<tr{low_flag}><td>{i}</td><td>{escape(s.asset_tag or "-")}</td><td>{escape(s.item_name)}</td>'
+               f'<td>{escape(s.category or "-")}</td><td>{escape(s.manufacturer or "-")}</td><td>{escape(s.model or "-")}</td>'
+               f'<td>{escape(s.serial_number or "-")}</td><td>{s.quantity}</td><td>{escape(s.unit or "-")}</td>'
+               f'<td>{s.unit_price or 0:.2f}</td><td>{s.total_value or 0:.2f}</td>'
+               f'<td>{escape(s.status or "-")}</td><td>{escape(s.condition)}</td>'
+               f'<td>{escape(s.assigned_name or "-")}</td><td>{escape(s.remarks or "-")}</td></tr>')
+    yield (f'</tbody>'
+           f'<tfoot><tr><td colspan="10" style="text-align:right;font-weight:bold;">Grand Total:</td>'
+           f'<td style="font-weight:bold;">{grand_total:.2f}</td><td colspan="4"></td></tr></tfoot></table>')
+
+
+def _pdf_head(title):
+    title = escape(title)
     return f'''<!DOCTYPE html>
 <html><head><meta charset="UTF-8"><title>{title}</title>
 <style>
@@ -706,4 +921,4 @@ tr:nth-child(even) {{ background: #f2f2f2; }}
 @media print {{ .print-btn {{ display: none; }} }}
 </style></head><body>
 <button class="print-btn" onclick="window.print()">Print / Save as PDF</button>
-<h1>{title}</h1>{body}</body></html>'''
+<h1>{title}</h1>'''
@@ -0,0 +1,51 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.pool import StaticPool
+
+from app import _user_cache, create_app, db
+
+
+@pytest.fixture
+def app():
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite://',
+        'SQLALCHEMY_ENGINE_OPTIONS': {
+            'poolclass': StaticPool,
+            'connect_args': {'check_same_thread': False},
+        },
+        'WTF_CSRF_ENABLED': False,
+    })
+    app.jinja_env.globals.setdefault('csrf_token', lambda: '')
+    yield app
+    # Process-level memos must not leak across test databases; the user
+    # loader's TTL cache would otherwise serve one test's User to the next.
+    from app.routes.stock import campus_choices, campus_info
+    campus_choices.cache_clear()
+    campus_info.cache_clear()
+    _user_cache.clear()
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    return client
+
+
+@pytest.fixture
+def query_counter(app):
+    """Collect every SQL statement executed while the fixture is active.
+
+    Safety net against re-introducing lazy-load N+1s: tests assert a
+    ceiling on len(query_counter) per route.
+    """
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', _record)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', _record)
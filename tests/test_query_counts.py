@@ -0,0 +1,38 @@
+from app import db
+from app.models import Campus, Stock
+
+N_CAMPUSES = 8
+
+
+def _seed(app):
+    with app.app_context():
+        for i in range(N_CAMPUSES):
+            campus = Campus(name=f'Campus {i}', code=f'C{i}')
+            db.session.add(campus)
+            db.session.flush()
+            for j in range(3):
+                db.session.add(Stock(item_name=f'Item {i}-{j}', quantity=5,
+                                     unit_price=10.0, campus_id=campus.id))
+        db.session.commit()
+
+
+def test_dashboard_query_count(app, client, query_counter):
+    _seed(app)
+    query_counter.clear()
+    response = client.get('/dashboard')
+    assert response.status_code == 200
+    # Ceiling well below one-query-per-campus; fails loudly if a lazy
+    # relationship or per-campus aggregate loop sneaks back in.
+    assert len(query_counter) < N_CAMPUSES * 2
+
+
+def test_campus_stocks_query_count(app, client, query_counter):
+    _seed(app)
+    with app.app_context():
+        campus_id = db.session.scalar(db.select(Campus.id).limit(1))
+    query_counter.clear()
+    response = client.get(f'/campus/{campus_id}/stocks')
+    assert response.status_code == 200
+    # Row count must not drive query count: campus + stocks (+ eager
+    # loads and the user loader) should stay in single digits.
+    assert len(query_counter) < 10